@@ -1,5 +1,6 @@
 import re
-from difflib import get_close_matches
+
+from email_common import build_bigram_index, build_domain_corrections, closest_domain, short_input_cache
 
 # Expanded list of common email domains
 COMMON_DOMAINS = [
@@ -9,6 +10,8 @@ COMMON_DOMAINS = [
     "tutanota.com", "fastmail.com", "mail.com", "web.de", "gmx.de", "t-online.de"
 ]
 
+COMMON_DOMAINS_SET = frozenset(COMMON_DOMAINS)
+
 # Known typos and their corrections
 TYPO_CORRECTIONS = {
     "gamil.com": "gmail.com",
@@ -24,9 +27,13 @@ TYPO_CORRECTIONS = {
     "gmail.co": "gmail.com",
     "gmail.cim": "gmail.com",
     "gmail.cm": "gmail.com",
+    "gmai.co": "gmail.com",
+    "gmail.comm": "gmail.com",
     "yahho.com": "yahoo.com",
     "yaho.com": "yahoo.com",
     "yahoo.co": "yahoo.com",
+    "yaoo.com": "yahoo.com",
+    "yhoo.com": "yahoo.com",
     "hotmal.com": "hotmail.com",
     "hotnail.com": "hotmail.com",
     "hotmial.com": "hotmail.com",
@@ -36,91 +43,121 @@ TYPO_CORRECTIONS = {
     "outllok.com": "outlook.com",
     "outloook.com": "outlook.com",
     "icloud.co": "icloud.com",
+    "iclod.com": "icloud.com",
+    "iclud.com": "icloud.com",
     "protonmaill.com": "protonmail.com",
     "proton.me.": "proton.me",
     "gmxde": "gmx.de",
-    "webd.de": "web.de"
+    "gmx.deu": "gmx.de",
+    "webd.de": "web.de",
+    "t-onlin.de": "t-online.de",
+    "t-online.cmo": "t-online.de",
 }
 
+# Every known domain and known typo, mapped to its canonical form
+DOMAIN_CORRECTIONS = build_domain_corrections(COMMON_DOMAINS, TYPO_CORRECTIONS)
+BIGRAM_INDEX = build_bigram_index(COMMON_DOMAINS)
+
 # Email regex pattern
-EMAIL_REGEX = re.compile(r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$")
-
-# Text normalization patterns
-DEOBF_PATTERNS = [
-    (r"\s*\(?\s*at\s*\)?\s*", "@"),
-    (r"\s*\(?\s*dot\s*\)?\s*", "."),
-    (r"\s*\[at\]\s*", "@"),
-    (r"\s*\[dot\]\s*", "."),
-    (r"\s*@,\.*\s*", "@"),  # fixes @,.gmai.com etc.
-    (r"\s+@\s+", "@"),
-]
+EMAIL_REGEX = re.compile(r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$", re.ASCII)
+
+# Already-clean lowercase address (no stray dots in the local part); together
+# with a known domain it can skip normalization entirely
+FAST_EMAIL_RE = re.compile(r"^[a-z0-9_%+\-]+(?:\.[a-z0-9_%+\-]+)*@([a-z0-9.\-]+)$", re.ASCII)
+
+# Text normalization patterns: every obfuscated "at"/"dot" token in one pass.
+# Bare words need word boundaries so "kate" or "dottie" are left alone.
+DEOBF_RE = re.compile(
+    r"\s*(?:\[at\]|\[dot\]|\(\s*at\s*\)|\(\s*dot\s*\)|\bat\b|\bdot\b"
+    r"|@,\.*|@)\s*",  # @,. fixes @,.gmai.com etc.
+    re.IGNORECASE,
+)
+
+# Runs of separators left after deobfuscation: anything around an "@"
+# collapses to a single "@", repeated dots collapse to one.
+SEPARATOR_RUN_RE = re.compile(r"(\.*@[@,.]*)|\.{2,}")
+
+def _deobf_token(m: re.Match) -> str:
+    return "." if "dot" in m.group(0) else "@"
+
+def _collapse_separators(m: re.Match) -> str:
+    return "@" if m.group(1) else "."
 
 def deobfuscate(s: str) -> str:
-    s = s.strip().lower()
-    for pat, repl in DEOBF_PATTERNS:
-        s = re.sub(pat, repl, s, flags=re.IGNORECASE)
-    return s
+    return DEOBF_RE.sub(_deobf_token, s.strip().lower())
 
 def normalize(email: str) -> str:
     email = deobfuscate(email)
     email = email.strip("<>\"' ,;:!()[]")
-    email = re.sub(r"@{2,}", "@", email)
-    email = re.sub(r"\.{2,}", ".", email)
-    email = re.sub(r"\s*@\s*", "@", email)
-    email = re.sub(r"\s+", "", email)
-    email = re.sub(r"@[,\.]+", "@", email)
-    if "@" in email:
-        local, domain = email.split("@", 1)
-        local = local.strip(".")
-        domain = domain.strip(".")
-        email = f"{local}@{domain}"
-    return email
-
-def correct_domain(email: str) -> tuple[str, bool]:
-    if "@" not in email:
-        return email, False
-    local, domain = email.split("@", 1)
-    domain = domain.strip().lower()
+    email = "".join(email.split())
+    email = SEPARATOR_RUN_RE.sub(_collapse_separators, email)
+    return email.strip(".")
 
-    # Apply typo corrections
-    if domain in TYPO_CORRECTIONS:
-        return f"{local}@{TYPO_CORRECTIONS[domain]}", True
+@short_input_cache(maxsize=4096)
+def correct_domain_part(domain: str) -> tuple[str, bool]:
+    # Known domain or known typo: no fuzzy matching needed
+    fixed = DOMAIN_CORRECTIONS.get(domain)
+    if fixed is not None:
+        return fixed, fixed != domain
 
     # Add missing TLD if domain looks like gmail or yahoo
     if "." not in domain:
         guess = domain + ".com"
-        if guess in COMMON_DOMAINS:
-            return f"{local}@{guess}", True
+        if guess in COMMON_DOMAINS_SET:
+            return guess, True
 
     # Fuzzy matching for close domains
-    match = get_close_matches(domain, COMMON_DOMAINS, n=1, cutoff=0.7)
+    match = closest_domain(domain, COMMON_DOMAINS, BIGRAM_INDEX, 0.7)
     if match:
-        return f"{local}@{match[0]}", True
+        return match, True
+
+    return domain, False
 
-    return f"{local}@{domain}", False
+def correct_domain(email: str) -> tuple[str, bool]:
+    if "@" not in email:
+        return email, False
+    local, domain = email.split("@", 1)
+    domain, fixed = correct_domain_part(domain.strip().lower())
+    return f"{local}@{domain}", fixed
 
 def is_valid(email: str) -> bool:
     return bool(EMAIL_REGEX.match(email))
 
+# Messy inputs repeat heavily in real lists, so each distinct one is
+# normalized, corrected and validated once
+@short_input_cache(maxsize=8192)
+def clean_messy(raw: str) -> str | None:
+    e = normalize(raw)
+    e, fixed = correct_domain(e)
+    return e if is_valid(e) else None
+
 def clean_emails(raw_list):
+    # email -> (domain, local, email), a pre-decorated sort record
+    cleaned = {}
+    # Cleaning only depends on the stripped, lowercased input, so repeats of
+    # it are skipped before any work is done
     seen = set()
-    cleaned = []
     for raw in raw_list:
         if not raw or not isinstance(raw, str):
             continue
-        e = normalize(raw)
-        e, fixed = correct_domain(e)
-        e = e.replace("..", ".").replace("@@", "@")
-        if not is_valid(e):
+        e = raw.strip().lower()
+        if e in seen:
             continue
-        if e not in seen:
-            seen.add(e)
-            cleaned.append(e)
-    cleaned.sort(key=lambda x: (x.split("@")[1], x.split("@")[0]))
+        seen.add(e)
+        # Common case first: most inputs are already well-formed
+        m = FAST_EMAIL_RE.match(e)
+        if m is None or m.group(1) not in COMMON_DOMAINS_SET:
+            e = clean_messy(e)
+            if e is None:
+                continue
+        if e not in cleaned:
+            local, _, domain = e.partition("@")
+            cleaned[e] = (domain, local, e)
+    cleaned = [record[2] for record in sorted(cleaned.values())]
     
-    # Save result as text file
-    with open("cleaned_emails.txt", "w", encoding="utf-8") as f:
-        f.write("\n".join(cleaned))
+    # Save result as text file, streamed through one large buffer
+    with open("cleaned_emails.txt", "wb", buffering=1 << 20) as f:
+        f.writelines(e.encode("utf-8") + b"\n" for e in cleaned)
     
     return cleaned
 
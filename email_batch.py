@@ -0,0 +1,199 @@
+"""Address cleaning for the bot: domain tables, regexes and clean_pieces().
+
+Kept apart from telegram_email_cleaner.py, which holds the Telegram and file
+handling; process-pool workers run clean_pieces() from here.
+"""
+import re
+from typing import List, Tuple, Dict
+
+from email_common import build_bigram_index, build_domain_corrections, closest_domain, short_input_cache
+
+# -----------------------
+# Common Email Domains + Known Typos
+# -----------------------
+COMMON_DOMAINS = [
+    "gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "icloud.com",
+    "aol.com", "comcast.net", "verizon.net", "msn.com", "live.com",
+    "protonmail.com", "proton.me", "zoho.com", "fastmail.com", "mail.com",
+    "gmx.com", "mail.ru", "yandex.com", "yandex.ru", "hotmail.co.uk", "hotmail.de",
+    "web.de", "gmx.de", "t-online.de", "freenet.de", "posteo.de",
+    "online.de", "arcor.de", "email.de", "outlook.de", "gmx.net",
+    "posteo.eu", "tutanota.com",
+]
+
+COMMON_DOMAIN_TYPOS = {
+    "gamil.com": "gmail.com",
+    "gmial.com": "gmail.com",
+    "gmaill.com": "gmail.com",
+    "gmai.com": "gmail.com",
+    "gmal.com": "gmail.com",
+    "gmaiil.com": "gmail.com",
+    "gmaul.com": "gmail.com",
+    "gmaik.com": "gmail.com",
+    "gnail.com": "gmail.com",
+    "gimail.com": "gmail.com",
+    "gmai.co": "gmail.com",
+    "gmail.co": "gmail.com",
+    "gmail.con": "gmail.com",
+    "gmail.comm": "gmail.com",
+    "gmail.cim": "gmail.com",
+    "gmail.cm": "gmail.com",
+    "hotnail.com": "hotmail.com",
+    "hotmial.com": "hotmail.com",
+    "hotmil.com": "hotmail.com",
+    "hotmal.com": "hotmail.com",
+    "hotmai.com": "hotmail.com",
+    "yaho.com": "yahoo.com",
+    "yahho.com": "yahoo.com",
+    "yaoo.com": "yahoo.com",
+    "yhoo.com": "yahoo.com",
+    "yahoo.co": "yahoo.com",
+    "outlok.com": "outlook.com",
+    "outllok.com": "outlook.com",
+    "outloook.com": "outlook.com",
+    "iclod.com": "icloud.com",
+    "iclud.com": "icloud.com",
+    "icloud.co": "icloud.com",
+    "protonmaill.com": "protonmail.com",
+    "proton.me.": "proton.me",
+    "webd.de": "web.de",
+    "gmxde": "gmx.de",
+    "gmx.deu": "gmx.de",
+    "t-onlin.de": "t-online.de",
+    "t-online.cmo": "t-online.de",
+}
+
+# Every known domain and known typo, mapped to its canonical form
+DOMAIN_CORRECTIONS = build_domain_corrections(COMMON_DOMAINS, COMMON_DOMAIN_TYPOS)
+BIGRAM_INDEX = build_bigram_index(COMMON_DOMAINS)
+
+# -----------------------
+# Email Validation and Cleaning Functions
+# -----------------------
+# A cleaned domain: allowed characters and a TLD of 2+ letters. Local parts
+# are guaranteed valid by normalize_local_part()/CLEAN_LOCAL_RE instead.
+DOMAIN_VALID_RE = re.compile(r"^[a-z0-9.-]+\.[a-z]{2,}$")
+
+# Patterns used on the per-email path, compiled once at import.
+# Local part: a run of dots/whitespace becomes one dot (none at either end),
+# anything else outside the allowed set is dropped.
+LOCAL_CLEANUP_RE = re.compile(r"[\s.]+|[^a-z0-9._%+\-\s]+")
+DOMAIN_DISALLOWED_RE = re.compile(r"[^\w.\-]")
+DOMAIN_DOT_RUN_RE = re.compile(r"\.{2,}")
+COM_TLD_TYPO_RE = re.compile(r"\.(con|cim|cm|c0m)$")
+DE_TLD_TYPO_RE = re.compile(r"\.(deu|d)$")
+# Anything outside this set is dropped; that includes quotes and \r\n\t, so
+# only plain spaces are left around the separators afterwards.
+EMAIL_DISALLOWED_RE = re.compile(r"[^\w@.\-+% ]")
+# A run of spaces, dots and "@" containing at least one dot or "@".
+SEPARATOR_RUN_RE = re.compile(r" *[.@][ .@]*")
+
+# Already-clean addresses on a known domain, matched in a single scan over
+# all pieces joined by PIECE_SEPARATOR. The lookarounds pin each match to a
+# whole piece; the local part has no leading, trailing or doubled dots.
+PIECE_SEPARATOR = "\x1e"
+KNOWN_EMAIL_RE = re.compile(
+    r"(?<![^\x1e])[a-z0-9_%+\-]+(?:\.[a-z0-9_%+\-]+)*@(?:"
+    + "|".join(re.escape(d) for d in COMMON_DOMAINS)
+    + r")(?![^\x1e])",
+    re.ASCII | re.IGNORECASE,
+)
+
+# A local part that is already lowercase, allowed characters only and single
+# dots between words: normalize_local_part() would return it unchanged.
+CLEAN_LOCAL_RE = re.compile(r"[a-z0-9_%+\-]+(?:\.[a-z0-9_%+\-]+)*", re.ASCII)
+
+def _local_cleanup(m: re.Match) -> str:
+    run = m.group(0)
+    if run[0] != "." and not run[0].isspace():
+        return ""
+    return "" if m.start() == 0 or m.end() == len(m.string) else "."
+
+def normalize_local_part(local: str) -> str:
+    return LOCAL_CLEANUP_RE.sub(_local_cleanup, local.strip().lower())
+
+def normalize_domain_part(domain: str) -> str:
+    # Dots are collapsed after the disallowed characters go, so the result
+    # is already normalized and one pass is enough
+    domain = DOMAIN_DISALLOWED_RE.sub("", domain.strip().lower())
+    domain = DOMAIN_DOT_RUN_RE.sub(".", domain)
+    domain = COM_TLD_TYPO_RE.sub(".com", domain)
+    domain = DE_TLD_TYPO_RE.sub(".de", domain)
+    return domain
+
+# Mailing lists repeat the same few domains thousands of times, so each
+# distinct domain only pays for the typo/fuzzy lookup once. Takes a domain
+# already passed through normalize_domain_part().
+@short_input_cache(maxsize=4096)
+def fuzzy_correct_domain(domain: str) -> Tuple[str, bool]:
+    fixed = DOMAIN_CORRECTIONS.get(domain)
+    if fixed is not None:
+        return fixed, fixed != domain
+    match = closest_domain(domain, COMMON_DOMAINS, BIGRAM_INDEX, 0.75)
+    if match:
+        return match, True
+    return domain, False
+
+def _collapse_separators(m: re.Match) -> str:
+    # Spaces around separators go, dot runs shrink to one dot and dots in
+    # front of an "@" are dropped; only a trailing dot survives after "@".
+    run = m.group(0).replace(" ", "")
+    if "@" not in run:
+        return "."
+    return "@" * run.count("@") + ("." if run[-1] == "." else "")
+
+@short_input_cache(maxsize=4096)
+def clean_domain(domain: str) -> str:
+    # Normalize, correct and validate a raw domain once per distinct value;
+    # "" means no address on this domain can be valid.
+    domain, _ = fuzzy_correct_domain(normalize_domain_part(domain))
+    return domain if DOMAIN_VALID_RE.match(domain) else ""
+
+# Uploads repeat the same messy addresses, so each distinct raw string is
+# cleaned once per process. Sized above the bot's PIECE_BATCH_SIZE so a whole
+# batch of distinct messy pieces fits before anything is evicted.
+@short_input_cache(maxsize=32768)
+def clean_single_email(raw: str) -> Tuple[str, str]:
+    s = raw.strip().lower()
+    # Neither substitution adds or removes the last "@", so junk without one
+    # is rejected before paying for them
+    if "@" not in s:
+        return "", "no_at"
+    s = EMAIL_DISALLOWED_RE.sub("", s)
+    s = SEPARATOR_RUN_RE.sub(_collapse_separators, s)
+    local, domain = s.split("@", 1)
+    # One scan settles most local parts; only messy ones need rewriting
+    if CLEAN_LOCAL_RE.fullmatch(local) is None:
+        local = normalize_local_part(local)
+    domain = clean_domain(domain)
+    # normalize_local_part() only leaves allowed characters, so together with
+    # a valid domain any non-empty local part makes a valid address.
+    if not local or not domain:
+        return "", "invalid_format"
+    return f"{local}@{domain}", ""
+
+def clean_pieces(pieces: List[str]) -> Tuple[Dict[str, Tuple[str, str, str]], List[Tuple[str, str]], int, int]:
+    # email -> (domain, local, email): insertion-ordered dedup plus a
+    # pre-decorated sort record, so sorting needs no key function
+    cleaned: Dict[str, Tuple[str, str, str]] = {}
+    removed = []
+    duplicates = 0
+
+    # Most pieces are already fine; find them all in one regex scan and only
+    # send the rest through clean_single_email().
+    already_clean = {m.group(0) for m in KNOWN_EMAIL_RE.finditer(PIECE_SEPARATOR.join(pieces))}
+
+    for candidate in pieces:
+        if candidate in already_clean:
+            cleaned_candidate = candidate.lower()
+        else:
+            cleaned_candidate, reason = clean_single_email(candidate)
+            if not cleaned_candidate:
+                removed.append((candidate, reason))
+                continue
+        if cleaned_candidate in cleaned:
+            duplicates += 1
+            continue
+        local, _, domain = cleaned_candidate.partition("@")
+        cleaned[cleaned_candidate] = (domain, local, cleaned_candidate)
+    return cleaned, removed, duplicates, len(pieces)
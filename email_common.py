@@ -0,0 +1,115 @@
+"""Fuzzy domain matching shared by the bot and Email_cleaner.py.
+
+Each module keeps its own domain list and typo table; these helpers build the
+lookup tables from them and search them. short_input_cache() is the
+length-bounded cache both modules put around their per-input cleaning.
+"""
+import functools
+from typing import List, Dict, Iterable, Iterator
+
+# Fast fuzzy matching (C++); indel_ratio() is used when it is not installed
+try:
+    from rapidfuzz import fuzz, process
+except Exception:
+    process = None
+
+# Longest input the caches below keep: an address is at most 320 characters
+# (64 local + "@" + 255 domain). Anything longer is cleaned uncached, so one
+# huge junk piece cannot stay pinned in a process-wide cache.
+MAX_CACHED_LENGTH = 320
+
+def short_input_cache(maxsize: int):
+    # functools.lru_cache for a function of one string, bypassed for strings
+    # longer than MAX_CACHED_LENGTH
+    def decorator(fn):
+        cached = functools.lru_cache(maxsize=maxsize)(fn)
+
+        @functools.wraps(fn)
+        def wrapper(s: str):
+            if len(s) > MAX_CACHED_LENGTH:
+                return fn(s)
+            return cached(s)
+
+        wrapper.cache_info = cached.cache_info
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+    return decorator
+
+def domain_bigrams(domain: str) -> set:
+    return {domain[i:i + 2] for i in range(len(domain) - 1)}
+
+def build_bigram_index(domains: Iterable[str]) -> Dict[str, set]:
+    # Bigram -> known domains containing it. Only domains sharing at least one
+    # bigram with the input are worth scoring.
+    index: Dict[str, set] = {}
+    for domain in domains:
+        for gram in domain_bigrams(domain):
+            index.setdefault(gram, set()).add(domain)
+    return index
+
+def domain_candidates(domain: str, domains: List[str], index: Dict[str, set]) -> List[str]:
+    candidates = set()
+    for gram in domain_bigrams(domain):
+        candidates |= index.get(gram, set())
+    # Keep list order: both matchers below take the first of equal scores,
+    # so ties resolve to the more common domain
+    return [d for d in domains if d in candidates]
+
+def indel_ratio(a: str, b: str) -> float:
+    # Pure Python fuzz.ratio: 2 * LCS / total length, so both paths agree
+    if not a and not b:
+        return 1.0
+    prev = [0] * (len(b) + 1)
+    for ca in a:
+        cur = [0]
+        for j, cb in enumerate(b):
+            cur.append(prev[j] + 1 if ca == cb else max(prev[j + 1], cur[j]))
+        prev = cur
+    return 2 * prev[-1] / (len(a) + len(b))
+
+def best_match(domain: str, candidates: List[str], cutoff: float):
+    if process is not None:
+        hit = process.extractOne(domain, candidates, scorer=fuzz.ratio, score_cutoff=cutoff * 100)
+        return hit[0] if hit else None
+    best, best_score = None, cutoff
+    for candidate in candidates:
+        score = indel_ratio(domain, candidate)
+        if score > best_score or (best is None and score == best_score):
+            best, best_score = candidate, score
+    return best
+
+def closest_domain(domain: str, domains: List[str], index: Dict[str, set], cutoff: float):
+    candidates = domain_candidates(domain, domains, index)
+    match = best_match(domain, candidates, cutoff)
+    if match is None and len(candidates) < len(domains):
+        # A domain sharing no bigram can still pass a low cutoff (m.ocm ->
+        # me.com at 0.7), so a miss rescores the rest of the list
+        shortlisted = set(candidates)
+        match = best_match(domain, [d for d in domains if d not in shortlisted], cutoff)
+    return match
+
+COM_TLD_TYPOS = (".con", ".cmo", ".coom")
+
+def one_edit_typos(domain: str) -> Iterator[str]:
+    # Single deletions and adjacent transpositions, plus common .com misspellings
+    for i in range(len(domain)):
+        yield domain[:i] + domain[i + 1:]
+    for i in range(len(domain) - 1):
+        yield domain[:i] + domain[i + 1] + domain[i] + domain[i + 2:]
+    if domain.endswith(".com"):
+        for tld in COM_TLD_TYPOS:
+            yield domain[:-4] + tld
+
+def build_domain_corrections(domains: List[str], typos: Dict[str, str]) -> Dict[str, str]:
+    # Known domains map to themselves and typos to their fix, so both are
+    # settled by a single lookup before any fuzzy matching. The one-edit
+    # neighbours of every known domain are added too; hand-written typos win,
+    # and a neighbour shared by two domains goes to the more common one.
+    known = set(domains)
+    corrections = dict(typos)
+    for domain in domains:
+        for typo in one_edit_typos(domain):
+            if typo not in known:
+                corrections.setdefault(typo, domain)
+    corrections.update((d, d) for d in domains)
+    return corrections
@@ -1,19 +1,25 @@
 import os
-import re
 import csv
 import time
-import difflib
 import logging
+import itertools
+import collections
 import asyncio
-from io import StringIO, BytesIO
-from typing import List, Tuple, Dict
+import multiprocessing
+import concurrent.futures
+import signal
+import threading
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from io import BytesIO, TextIOWrapper
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple, Dict, Iterable, Iterator, BinaryIO
 import sys
 
 # Networking + Telegram
 from aiohttp import web
 from telegram import Update, InputFile
-import nest_asyncio
-nest_asyncio.apply()
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -22,152 +28,151 @@ from telegram.ext import (
     filters,
 )
 
-# Excel support
-try:
-    import openpyxl
-except Exception:
-    openpyxl = None
+from email_batch import clean_pieces
 
 # -----------------------
 # Logging
 # -----------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ],
-)
+# Handlers are attached in main(): spawned pool workers re-import this
+# script and must not open bot.log themselves.
 logger = logging.getLogger("email-cleaner-bot")
 
 # -----------------------
-# Common Email Domains + Known Typos
-# -----------------------
-COMMON_DOMAINS = [
-    "gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "icloud.com",
-    "aol.com", "comcast.net", "verizon.net", "msn.com", "live.com",
-    "protonmail.com", "proton.me", "zoho.com", "fastmail.com", "mail.com",
-    "gmx.com", "mail.ru", "yandex.com", "yandex.ru", "hotmail.co.uk", "hotmail.de",
-    "web.de", "gmx.de", "t-online.de", "freenet.de", "posteo.de",
-    "online.de", "arcor.de", "email.de", "outlook.de", "gmx.net",
-    "posteo.eu", "tutanota.com",
-]
-
-COMMON_DOMAIN_TYPOS = {
-    "gamil.com": "gmail.com",
-    "gmial.com": "gmail.com",
-    "gmaill.com": "gmail.com",
-    "gmai.com": "gmail.com",
-    "gmal.com": "gmail.com",
-    "gmaiil.com": "gmail.com",
-    "gmaul.com": "gmail.com",
-    "gmai.co": "gmail.com",
-    "gmail.co": "gmail.com",
-    "gmail.con": "gmail.com",
-    "gmail.comm": "gmail.com",
-    "hotnail.com": "hotmail.com",
-    "hotmial.com": "hotmail.com",
-    "hotmil.com": "hotmail.com",
-    "yaho.com": "yahoo.com",
-    "yahho.com": "yahoo.com",
-    "yaoo.com": "yahoo.com",
-    "yhoo.com": "yahoo.com",
-    "outlok.com": "outlook.com",
-    "outllok.com": "outlook.com",
-    "outloook.com": "outlook.com",
-    "iclod.com": "icloud.com",
-    "iclud.com": "icloud.com",
-    "protonmaill.com": "protonmail.com",
-    "webd.de": "web.de",
-    "gmxde": "gmx.de",
-    "gmx.deu": "gmx.de",
-    "t-onlin.de": "t-online.de",
-    "t-online.cmo": "t-online.de",
-}
-
-COMMON_DOMAINS_SET = set(COMMON_DOMAINS)
-
-# -----------------------
-# Email Validation and Cleaning Functions
+# Input Splitting and Batching
 # -----------------------
-EMAIL_VALID_RE = re.compile(r"^[a-z0-9._%+\-]+@[a-z0-9.-]+\.[a-z]{2,}$")
-
-def normalize_local_part(local: str) -> str:
-    local = local.strip().lower()
-    local = re.sub(r"\s+", ".", local)
-    local = re.sub(r"\.{2,}", ".", local)
-    local = re.sub(r"^\.", "", local)
-    local = re.sub(r"\.$", "", local)
-    local = re.sub(r"[^a-z0-9._%+\-]", "", local)
-    return local
-
-def normalize_domain_part(domain: str) -> str:
-    domain = domain.strip().lower()
-    domain = domain.replace("..", ".")
-    domain = re.sub(r"[^\w.\-]", "", domain)
-    domain = re.sub(r"\.(con|cim|cm|c0m)$", ".com", domain)
-    domain = re.sub(r"\.(deu|d)$", ".de", domain)
-    return domain
-
-def fuzzy_correct_domain(domain: str) -> Tuple[str, bool]:
-    domain = normalize_domain_part(domain)
-    if domain in COMMON_DOMAIN_TYPOS:
-        return COMMON_DOMAIN_TYPOS[domain], True
-    if domain in COMMON_DOMAINS_SET:
-        return domain, False
-    match = difflib.get_close_matches(domain, COMMON_DOMAINS, n=1, cutoff=0.75)
-    if match:
-        return match[0], True
-    return domain, False
-
-def clean_single_email(raw: str) -> Tuple[str, str]:
-    s = raw.strip().lower()
-    s = s.strip('\'"')
-    s = re.sub(r"[\r\n\t]", "", s)
-    s = re.sub(r"[^\w@.\-+% ]", "", s)
-    s = re.sub(r"\s*@\s*", "@", s)
-    s = re.sub(r"\s*\.\s*", ".", s)
-    s = re.sub(r"\.{2,}", ".", s)
-    s = re.sub(r"\.+@", "@", s)
-    if "@" not in s:
-        return "", "no_at"
-    local, domain = s.split("@", 1)
-    local = normalize_local_part(local)
-    domain = normalize_domain_part(domain)
-    domain, _ = fuzzy_correct_domain(domain)
-    candidate = f"{local}@{domain}"
-    if not EMAIL_VALID_RE.match(candidate):
-        return "", "invalid_format"
-    return candidate, ""
-
-def clean_email_list(items: List[str]) -> Dict:
-    start = time.time()
-    seen, cleaned, removed = set(), [], []
-    duplicates, total_input = 0, 0
+# Splitters for pasted text and delimited cells. Mapping every separator to
+# one character and using str.split() keeps the regex engine out of it.
+ITEM_SEPARATORS = str.maketrans(",;|", "\t\t\t")   # then .split("\t")
+LINE_SEPARATORS = str.maketrans("\r", "\n")       # then .split("\n")
+TEXT_SEPARATORS = str.maketrans(",;|", "   ")     # then .split() on any whitespace
+CSV_FALLBACK_SEPARATORS = str.maketrans(",;", "  ")
+
+# Input is cleaned in batches of this many pieces, so readers can stream into
+# clean_email_list() without the whole upload being held as one list. With
+# worker processes enabled, inputs spanning several batches are spread across
+# them; below that the pickling and dispatch overhead outweighs the gain.
+PIECE_BATCH_SIZE = 20000
+# A batch takes well under a second; a worker still busy after this long is
+# assumed dead with its result half-written, which never breaks the pool
+PIECE_BATCH_TIMEOUT = 60.0
+
+# Worker processes for those inputs. Off by default: each worker re-imports
+# this script, and a small or CPU-limited instance gains nothing from them.
+CLEANER_WORKERS = int(os.getenv("CLEANER_WORKERS", "1"))
+
+_process_pool = None
+# get_process_pool() runs on several cleaner executor threads at once
+_process_pool_lock = threading.Lock()
+
+# Thread pool for the handlers' blocking parse/clean work, created in main()
+_cleaner_executor = None
+
+def get_process_pool() -> concurrent.futures.ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                # spawn: workers must not inherit the bot's threads and event loop
+                _process_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=CLEANER_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _process_pool
+
+def discard_process_pool(pool: concurrent.futures.ProcessPoolExecutor) -> None:
+    # A worker died and the pool is unusable; the next get_process_pool()
+    # call starts a fresh one
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    # A wedged pool never stops its workers itself, and shutdown() forgets them
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+def batch_result(future: concurrent.futures.Future):
+    if not concurrent.futures.wait([future], timeout=PIECE_BATCH_TIMEOUT).done:
+        raise BrokenProcessPool("cleaner batch timed out")
+    return future.result()
+
+def map_in_order(pool: concurrent.futures.ProcessPoolExecutor, fn, batches: Iterable, window: int) -> Iterator:
+    # Like pool.map(), but with at most `window` batches submitted at once, so
+    # the reader is only pulled as fast as the workers finish batches. If the
+    # pool breaks, the batches not yet returned are run in this thread.
+    batches = iter(batches)
+    pending = collections.deque()
+    try:
+        for batch in batches:
+            try:
+                pending.append((batch, pool.submit(fn, batch)))
+            except BrokenProcessPool:
+                batches = itertools.chain([batch], batches)
+                raise
+            if len(pending) >= window:
+                result = batch_result(pending[0][1])
+                pending.popleft()
+                yield result
+        while pending:
+            result = batch_result(pending[0][1])
+            pending.popleft()
+            yield result
+    except BrokenProcessPool:
+        logger.warning("Cleaner process pool broke; cleaning the rest in-thread")
+        discard_process_pool(pool)
+        unfinished = [batch for batch, _ in pending]
+        pending.clear()
+        yield from map(fn, itertools.chain(unfinished, batches))
+    finally:
+        for _, future in pending:
+            future.cancel()
 
+def iter_piece_batches(items: Iterable[str]) -> Iterator[List[str]]:
+    batch = []
     for raw in items:
         if not raw or not isinstance(raw, str):
             continue
-        for p in re.split(r"[,\t;|]+", raw):
+        for p in raw.translate(ITEM_SEPARATORS).split("\t"):
             candidate = p.strip()
-            if not candidate:
-                continue
-            total_input += 1
-            cleaned_candidate, reason = clean_single_email(candidate)
-            if not cleaned_candidate:
-                removed.append((candidate, reason))
-                continue
-            if cleaned_candidate in seen:
+            if candidate:
+                batch.append(candidate)
+        if len(batch) >= PIECE_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def clean_email_list(items: Iterable[str]) -> Dict:
+    start = time.time()
+    batches = iter_piece_batches(items)
+    head = list(itertools.islice(batches, 2))
+    batches = itertools.chain(head, batches)
+    if len(head) > 1 and CLEANER_WORKERS > 1:
+        results = map_in_order(get_process_pool(), clean_pieces, batches, CLEANER_WORKERS + 1)
+    else:
+        results = map(clean_pieces, batches)
+
+    cleaned: Dict[str, Tuple[str, str, str]] = {}
+    removed = []
+    duplicates, total_input = 0, 0
+    # Batches come back in input order, so merging them gives the same result
+    # as a single pass; addresses repeated across batches count as duplicates.
+    for part_cleaned, part_removed, part_duplicates, part_total in results:
+        total_input += part_total
+        removed.extend(part_removed)
+        duplicates += part_duplicates
+        for email, record in part_cleaned.items():
+            if email in cleaned:
                 duplicates += 1
-                continue
-            seen.add(cleaned_candidate)
-            cleaned.append(cleaned_candidate)
+            else:
+                cleaned[email] = record
 
-    cleaned.sort(key=lambda x: (x.split("@")[1], x.split("@")[0]))
+    # Tuples compare in C: domain, then local part
+    ordered = [record[2] for record in sorted(cleaned.values())]
     elapsed = time.time() - start
     return {
-        "cleaned": cleaned,
+        "cleaned": ordered,
         "removed": removed,
         "summary": {
             "total_input": total_input,
@@ -181,33 +186,138 @@ def clean_email_list(items: List[str]) -> Dict:
 # -----------------------
 # File Handlers
 # -----------------------
-def read_txt(content: str) -> List[str]:
-    return [line.strip() for line in content.splitlines() if line.strip()]
-
-def read_csv(content: str) -> List[str]:
-    out = []
-    f = StringIO(content)
+# Readers are generators so cells stream straight into clean_email_list().
+# They read the download buffer in place, and text uploads are decoded line
+# by line, so the upload is held once, as raw bytes.
+def read_txt(data: BinaryIO) -> Iterator[str]:
+    for chunk in TextIOWrapper(data, encoding="utf-8"):
+        # splitlines() also breaks on the separators the wrapper ignores (\v, \f, \x85...)
+        for line in chunk.splitlines():
+            line = line.strip()
+            if line:
+                yield line
+
+def read_csv(data: BinaryIO) -> Iterator[str]:
+    f = TextIOWrapper(data, encoding="utf-8", newline="")
     try:
         reader = csv.reader(f)
         for row in reader:
             for cell in row:
                 if "@" in cell:
-                    out.append(cell.strip())
+                    yield cell.strip()
     except Exception:
-        out.extend(re.split(r'[\s,;]+', content))
-    return out
-
-def read_xlsx_bytes(data: bytes) -> List[str]:
-    if openpyxl is None:
-        raise RuntimeError("openpyxl not installed")
-    wb = openpyxl.load_workbook(BytesIO(data), read_only=True, data_only=True)
-    out = []
-    for sheet in wb.worksheets:
-        for row in sheet.iter_rows(values_only=True):
-            for cell in row:
-                if cell and "@" in str(cell):
-                    out.append(str(cell).strip())
-    return out
+        f.seek(0)
+        yield from f.read().translate(CSV_FALLBACK_SEPARATORS).split()
+
+# .xlsx is a zip of XML parts. Only cell text matters here, so the sheets are
+# streamed with iterparse instead of loading styles and formatting metadata.
+# Parts are located through the package relationships, like openpyxl does,
+# since their file names are not fixed.
+XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+XLSX_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+XLSX_RELATIONSHIP = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+XLSX_SHEET = XLSX_NS + "sheet"
+XLSX_STRING_ITEM = XLSX_NS + "si"
+XLSX_CELL = XLSX_NS + "c"
+XLSX_ROW = XLSX_NS + "row"
+XLSX_VALUE = XLSX_NS + "v"
+XLSX_TEXT = XLSX_NS + "t"
+# Numbers, booleans, errors and dates never hold an "@"; only these cell
+# types can carry text
+XLSX_TEXT_TYPES = frozenset(("s", "str", "inlineStr"))
+
+def read_xlsx_rels(zf: zipfile.ZipFile, part: str) -> Dict[str, Tuple[str, str]]:
+    # Relationship Id -> (type, zip path of the target) for one package part;
+    # "" is the package root
+    folder, name = posixpath.split(part)
+    try:
+        root = ET.fromstring(zf.read(posixpath.join(folder, "_rels", name + ".rels")))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in root.iter(XLSX_RELATIONSHIP):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            path = target.lstrip("/")
+        else:
+            path = posixpath.normpath(posixpath.join(folder, target))
+        rels[rel.get("Id")] = (rel.get("Type", ""), path)
+    return rels
+
+def find_xlsx_parts(zf: zipfile.ZipFile) -> Tuple[str, List[str]]:
+    # Shared strings part ("" if none) and the worksheet parts in workbook order
+    workbook = next(
+        (path for rel_type, path in read_xlsx_rels(zf, "").values() if rel_type.endswith("/officeDocument")),
+        "xl/workbook.xml",
+    )
+    rels = read_xlsx_rels(zf, workbook)
+    shared = next((path for rel_type, path in rels.values() if rel_type.endswith("/sharedStrings")), "")
+    sheets = []
+    for sheet in ET.fromstring(zf.read(workbook)).iter(XLSX_SHEET):
+        rel = rels.get(sheet.get(XLSX_REL_ID))
+        if rel and rel[0].endswith("/worksheet"):
+            sheets.append(rel[1])
+    if not sheets:
+        raise ValueError("workbook has no worksheets")
+    return shared, sheets
+
+def read_xlsx_shared_strings(zf: zipfile.ZipFile, name: str) -> List[str]:
+    shared = []
+    if not name:
+        return shared
+    with zf.open(name) as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == XLSX_STRING_ITEM:
+                # Plain <t> or rich-text runs <r><t>; phonetic <rPh> hints are skipped
+                parts = elem.findall(XLSX_TEXT) or elem.findall(f"{XLSX_NS}r/{XLSX_TEXT}")
+                shared.append("".join(t.text or "" for t in parts))
+                elem.clear()
+    return shared
+
+def read_xlsx_bytes(data: BinaryIO) -> Iterator[str]:
+    with zipfile.ZipFile(data) as zf:
+        shared_name, sheets = find_xlsx_parts(zf)
+        shared = read_xlsx_shared_strings(zf, shared_name)
+        for name in sheets:
+            with zf.open(name) as f:
+                for _, elem in ET.iterparse(f):
+                    if elem.tag != XLSX_CELL:
+                        if elem.tag == XLSX_ROW:
+                            elem.clear()
+                        continue
+                    cell_type = elem.get("t")
+                    if cell_type not in XLSX_TEXT_TYPES:
+                        elem.clear()
+                        continue
+                    if cell_type == "inlineStr":
+                        value = "".join(t.text or "" for t in elem.iter(XLSX_TEXT))
+                    else:
+                        v = elem.find(XLSX_VALUE)
+                        value = v.text if v is not None else None
+                        if value is not None and cell_type == "s":
+                            value = shared[int(value)]
+                    if value and "@" in value:
+                        yield value.strip()
+                    elem.clear()
+
+SUPPORTED_EXTENSIONS = ('.txt', '.csv', '.xlsx')
+
+def read_document(filename: str, data: BinaryIO) -> Iterator[str]:
+    if filename.endswith('.txt'):
+        return read_txt(data)
+    if filename.endswith('.csv'):
+        return read_csv(data)
+    return read_xlsx_bytes(data)
+
+def clean_document(filename: str, data: BinaryIO) -> Dict:
+    return clean_email_list(read_document(filename, data))
+
+def cleaned_file(emails: List[str]) -> InputFile:
+    # Built in memory per request, never written to disk
+    data = ("\n".join(emails) + "\n").encode("utf-8")
+    return InputFile(BytesIO(data), filename="cleaned_emails.txt")
 
 # -----------------------
 # Telegram Handlers
@@ -220,10 +330,12 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text or ""
-    items = [x.strip() for x in re.split(r'[\r\n]+', text) if x.strip()]
+    items = [x.strip() for x in text.translate(LINE_SEPARATORS).split("\n") if x.strip()]
     if len(items) == 1:
-        items = re.split(r'[,\s;|]+', items[0])
-    result = clean_email_list(items)
+        items = items[0].translate(TEXT_SEPARATORS).split()
+    # Cleaning is CPU-bound; keep it off the event loop so other chats and
+    # the health check are not stalled by a large paste.
+    result = await asyncio.get_running_loop().run_in_executor(_cleaner_executor, clean_email_list, items)
     await send_results(update, result)
 
 async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -232,26 +344,25 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Please upload a file (.txt, .csv, .xlsx)")
         return
     filename = doc.file_name.lower()
+    if not filename.endswith(SUPPORTED_EXTENSIONS):
+        await update.message.reply_text("File format not supported. Please upload .txt, .csv, or .xlsx.")
+        return
     file = await doc.get_file()
-    data = await file.download_as_bytearray()
-
-    text_items = []
+    # Download into the one buffer the readers work from
+    data = BytesIO()
+    await file.download_to_memory(data)
+    data.seek(0)
+
+    # Parsing and cleaning block for seconds on big uploads; run them in the
+    # cleaner executor so the event loop keeps serving other updates. The
+    # reader streams into the cleaner, so both happen in this one call.
     try:
-        if filename.endswith('.txt'):
-            text_items = read_txt(data.decode())
-        elif filename.endswith('.csv'):
-            text_items = read_csv(data.decode())
-        elif filename.endswith('.xlsx'):
-            text_items = read_xlsx_bytes(data)
-        else:
-            await update.message.reply_text("File format not supported. Please upload .txt, .csv, or .xlsx.")
-            return
+        result = await asyncio.get_running_loop().run_in_executor(_cleaner_executor, clean_document, filename, data)
     except Exception as e:
         logger.error(f"Error reading file: {e}")
         await update.message.reply_text("There was an error processing the file. Please try again.")
         return
 
-    result = clean_email_list(text_items)
     await send_results(update, result)
 
 async def send_results(update: Update, result: Dict):
@@ -261,26 +372,25 @@ async def send_results(update: Update, result: Dict):
         await update.message.reply_text("No valid emails found.")
         return
 
-    # Prepare the cleaned emails in a text file
-    cleaned_txt = "\n".join(cleaned_emails)
-    with open("cleaned_emails.txt", "w", encoding="utf-8") as f:
-        f.write(cleaned_txt)
-
-    # Send the file
-    with open("cleaned_emails.txt", "rb") as f:
-        await update.message.reply_document(
-            document=f,
-            filename="cleaned_emails.txt",
-            caption=f"Cleaned emails - {summary['kept']} valid emails out of {summary['total_input']}.",
-        )
-
-    # Optionally remove the file after sending it
-    os.remove("cleaned_emails.txt")
+    await update.message.reply_document(
+        document=cleaned_file(cleaned_emails),
+        caption=f"Cleaned emails - {summary['kept']} valid emails out of {summary['total_input']}.",
+    )
 
 # -----------------------
 # Start Telegram Bot
 # -----------------------
 async def main():
+    global _cleaner_executor
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler("bot.log"),
+            logging.StreamHandler()
+        ],
+    )
+
     # Read token from environment to avoid committing secrets in source.
     # Support multiple environment variable names for convenience.
     token = os.getenv("BOT_API_TOKEN") or os.getenv("TELEGRAM_BOT_TOKEN") or os.getenv("TELEGRAM_TOKEN")
@@ -289,14 +399,20 @@ async def main():
         print("Error: bot token environment variable is not set.\nSet it like: export TELEGRAM_BOT_TOKEN='<your-token>'\nThen run: python3 telegram_email_cleaner.py")
         return
 
-    # Do not log the token value to avoid accidental leaks
-    application = ApplicationBuilder().token(token).build()
+    # Do not log the token value to avoid accidental leaks.
+    # PTB already pools up to 256 connections; allow concurrent uploads to wait
+    # longer than the default 1s for a free one instead of failing.
+    application = ApplicationBuilder().token(token).pool_timeout(10.0).build()
 
     # Handlers
     application.add_handler(CommandHandler("start", cmd_start))
     application.add_handler(MessageHandler(filters.TEXT, handle_text))
     application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
 
+    _cleaner_executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(32, (os.cpu_count() or 1) + 4), thread_name_prefix="cleaner"
+    )
+
     # Start a tiny web server so Render can use a Web service (health checks / port binding).
     port = int(os.getenv("PORT", "10000"))
     app = web.Application()
@@ -312,12 +428,34 @@ async def main():
     await site.start()
     logger.info(f"Health server started on port {port}")
 
+    # Stop cleanly on Ctrl+C locally and on SIGTERM from Render
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
     try:
-        # Run the bot (polling) — the web server runs concurrently and keeps Render happy.
-        await application.run_polling()
+        # Poll Telegram on this same loop; the web server keeps running beside it
+        # and keeps Render happy. run_polling() would try to own the loop.
+        async with application:
+            try:
+                await application.start()
+                await application.updater.start_polling()
+                await stop.wait()
+            finally:
+                # Also on errors and cancellation: shutdown() refuses to run
+                # while the application is still running
+                if application.updater.running:
+                    await application.updater.stop()
+                if application.running:
+                    await application.stop()
     finally:
         # Clean up web server on shutdown
         await runner.cleanup()
+        _cleaner_executor.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
     asyncio.run(main())